@@ -1,25 +1,33 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-from urllib.parse import urlparse  # Änderung hier: wir nutzen urllib statt werkzeug
-from models import User, db
+from urllib.parse import urlsplit  # Änderung hier: wir nutzen urllib statt werkzeug
+from sqlalchemy import or_
+from models import User, db, DUMMY_HASH, verify_password
 
 auth = Blueprint('auth', __name__)
 
 @auth.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     
     if request.method == 'POST':
         user = User.query.filter_by(username=request.form['username']).first()
-        if user is None or not user.check_password(request.form['password']):
+        # Immer eine Verifikation durchführen, auch wenn der User nicht existiert -
+        # sonst verrät die Antwortzeit, welche Benutzernamen existieren
+        password_ok = verify_password(
+            user.password_hash if user else DUMMY_HASH,
+            request.form['password']
+        )
+
+        if user is None or not password_ok:
             flash('Ungültiger Benutzername oder Passwort')
             return redirect(url_for('auth.login'))
         
         login_user(user)
         next_page = request.args.get('next')
-        if not next_page or urlparse(next_page).netloc != '':  # Änderung hier
-            next_page = url_for('home')
+        if not next_page or urlsplit(next_page).netloc:  # nur relative Ziele zulassen
+            next_page = url_for('main.home')
         return redirect(next_page)
     
     return render_template('auth/login.html')
@@ -27,16 +35,19 @@ def login():
 @auth.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('main.home'))
     
     if request.method == 'POST':
-        user = User.query.filter_by(username=request.form['username']).first()
-        if user is not None:
-            flash('Bitte wählen Sie einen anderen Benutzernamen.')
-            return redirect(url_for('auth.register'))
-        
-        if User.query.filter_by(email=request.form['email']).first() is not None:
-            flash('Bitte verwenden Sie eine andere E-Mail-Adresse.')
+        # Username und E-Mail in einer einzigen Abfrage prüfen statt in zweien
+        existing = User.query.with_entities(User.username, User.email).filter(or_(
+            User.username == request.form['username'],
+            User.email == request.form['email']
+        )).first()
+        if existing is not None:
+            if existing.username == request.form['username']:
+                flash('Bitte wählen Sie einen anderen Benutzernamen.')
+            else:
+                flash('Bitte verwenden Sie eine andere E-Mail-Adresse.')
             return redirect(url_for('auth.register'))
         
         user = User(
@@ -57,4 +68,4 @@ def register():
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('home'))
\ No newline at end of file
+    return redirect(url_for('main.home'))
\ No newline at end of file
@@ -1,6 +1,9 @@
-from run import app
-from models import db, User, UserRole
-from werkzeug.security import generate_password_hash
+from run import create_app
+from models import db, User, UserRole, hash_password
+from sqlalchemy import insert
+
+# Minimale App ohne Auth/Login-Setup - fürs Seeden reicht die DB-Anbindung
+app = create_app(cli=True)
 
 test_users = [
     {
@@ -61,18 +64,27 @@ test_users = [
 
 def create_test_users():
     with app.app_context():
-        for user_data in test_users:
-            # Prüfen ob User bereits existiert
-            if not User.query.filter_by(username=user_data["username"]).first():
-                new_user = User(
-                    username=user_data["username"],
-                    email=user_data["email"],
-                    role=UserRole.USER,  # Geändert von DOCTOR zu USER
-                    work_percentage=user_data["work_percentage"]
-                )
-                new_user.set_password(user_data["password"])  # Nutze die set_password Methode
-                db.session.add(new_user)
-        
+        # Alle vorhandenen Usernamen mit einer einzigen IN-Abfrage holen
+        # statt einer Abfrage pro Testuser
+        names = [u["username"] for u in test_users]
+        existing = {row.username for row in User.query
+                    .with_entities(User.username)
+                    .filter(User.username.in_(names)).all()}
+
+        # Ein einziges Multi-Row-INSERT statt ORM-Buchhaltung pro Testuser
+        rows = [
+            {
+                "username": user_data["username"],
+                "email": user_data["email"],
+                "password_hash": hash_password(user_data["password"]),
+                "role": UserRole.USER.value,  # Geändert von DOCTOR zu USER
+                "work_percentage": user_data["work_percentage"],
+            }
+            for user_data in test_users
+            if user_data["username"] not in existing
+        ]
+        if rows:
+            db.session.execute(insert(User), rows)
         db.session.commit()
         
         # Überprüfen der angelegten User
@@ -80,7 +92,7 @@ def create_test_users():
         print("-" * 50)
         all_users = User.query.all()
         for user in all_users:
-            print(f"Username: {user.username:12} | Role: {user.role.value:7} | Work%: {user.work_percentage:3}%")
+            print(f"Username: {user.username:12} | Role: {user.role:7} | Work%: {user.work_percentage:3}%")
 
 if __name__ == '__main__':
     create_test_users()
\ No newline at end of file
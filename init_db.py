@@ -1,37 +1,46 @@
-from run import app
+from run import create_app
 from models import db, User, UserRole
-from werkzeug.security import generate_password_hash
 import os
 import sys
 
+# Minimale App ohne Auth/Login-Setup - für das DB-Setup reicht die Anbindung
+app = create_app(cli=True)
+
 def init_db():
     with app.app_context():
         # Erstellt alle Tabellen
         db.create_all()
         
         # Erstelle Admin-User falls nicht vorhanden
-        # Das Admin-Passwort muss über die Umgebungsvariable ADMIN_PASSWORD gesetzt werden
-        admin = User.query.filter_by(username='JuliaSchmeller').first()
+        # Das Admin-Passwort muss über die Umgebungsvariable ADMIN_PASSWORD gesetzt
+        # werden; alternativ ADMIN_PASSWORD_HASH mit einem fertigen Argon2-Hash,
+        # dann entfällt das (bewusst teure) Hashen beim Deployment komplett
+        admin_username = os.environ.get('ADMIN_USERNAME', 'JuliaSchmeller')
+        admin = User.query.filter_by(username=admin_username).first()
         if not admin:
+            admin_password_hash = os.environ.get('ADMIN_PASSWORD_HASH')
             admin_password = os.environ.get('ADMIN_PASSWORD')
-            if not admin_password:
+            if not admin_password_hash and not admin_password:
                 print("WARNUNG: Kein Admin-User wurde erstellt!", file=sys.stderr)
                 print("Um einen Admin-User zu erstellen, setzen Sie die Umgebungsvariable ADMIN_PASSWORD", file=sys.stderr)
                 print("Beispiel: export ADMIN_PASSWORD='your-secure-password-here'", file=sys.stderr)
                 print("Dann führen Sie 'python init_db.py' erneut aus.", file=sys.stderr)
             else:
                 admin = User(
-                    username='JuliaSchmeller',
+                    username=admin_username,
                     email='julia@example.com',
-                    role=UserRole.PLANNER,
+                    role=UserRole.PLANNER.value,
                     work_percentage=100
                 )
-                admin.password_hash = generate_password_hash(admin_password)
+                if admin_password_hash:
+                    admin.password_hash = admin_password_hash
+                else:
+                    admin.set_password(admin_password)
                 db.session.add(admin)
                 db.session.commit()
                 print("Admin-User wurde erstellt!")
         else:
-            admin.role = UserRole.PLANNER
+            admin.role = UserRole.PLANNER.value
             db.session.commit()
             print("Existierender User wurde zum Planner gemacht!")
 
@@ -1,11 +1,34 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, VerificationError, InvalidHashError
+from sqlalchemy.orm import Mapped, mapped_column
+import datetime
 from enum import Enum
+from typing import Optional
 
 db = SQLAlchemy()
 
+# Ein gemeinsamer Hasher auf Modulebene - der Konstruktor validiert Parameter
+# und alloziert Puffer, das muss nicht bei jedem Login erneut passieren
+_PH = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+# Für den Dummy-Abgleich bei unbekanntem Benutzernamen (siehe auth.login)
+DUMMY_HASH = _PH.hash("dummy")
+
+
+def hash_password(password):
+    """Hasht ein Passwort mit den Standard-Parametern der Anwendung."""
+    return _PH.hash(password)
+
+
+def verify_password(password_hash, password):
+    """Prüft ein Passwort gegen einen Argon2-Hash; liefert False statt Exceptions."""
+    try:
+        return _PH.verify(password_hash, password)
+    except (VerifyMismatchError, VerificationError, InvalidHashError):
+        return False
+
 class UserRole(Enum):
     USER = "user"
     PLANNER = "planner"
@@ -16,34 +39,59 @@ class DutyType(Enum):
     VISITE = "visite"
 
 class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128))
-    role = db.Column(db.Enum(UserRole), default=UserRole.USER)
-    work_percentage = db.Column(db.Integer, default=100)
+    # Rollen als String + CHECK statt db.Enum: erspart die Enum-Konvertierung
+    # bei jeder geladenen Zeile, die Python-Enums bleiben als Konstanten
+    __table_args__ = (
+        db.CheckConstraint("role IN ('user', 'planner')", name='ck_user_role'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    username: Mapped[str] = mapped_column(db.String(80), unique=True)
+    email: Mapped[str] = mapped_column(db.String(120), unique=True)
+    password_hash: Mapped[Optional[str]] = mapped_column(db.String(255))
+    role: Mapped[str] = mapped_column(db.String(16), default=UserRole.USER.value)
+    work_percentage: Mapped[int] = mapped_column(default=100)
 
     # Beziehungen
-    duties = db.relationship('Schedule', backref='user', lazy=True)
-    availabilities = db.relationship('Availability', backref='user', lazy=True)
+    duties: Mapped[list['Schedule']] = db.relationship(back_populates='user')
+    availabilities: Mapped[list['Availability']] = db.relationship(back_populates='user')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Argon2id statt PBKDF2: deutlich schneller bei vergleichbarer Sicherheit
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
 class Schedule(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, nullable=False)
-    duty_type = db.Column(db.Enum(DutyType), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Kalender- und Planungsabfragen filtern immer über den Datumsbereich,
+    # ohne Index wird daraus ein Full-Table-Scan über alle Altdaten
+    __table_args__ = (
+        db.Index('ix_schedule_date_duty_type', 'date', 'duty_type'),
+        # Der Scheduler fragt Belegungen als (Datum, Arzt)-Paare ab; der
+        # Verbundindex deckt diese Abfrage ohne Tabellenzugriff ab
+        db.Index('ix_schedule_date_user', 'date', 'user_id'),
+        db.CheckConstraint(
+            "duty_type IN ('dienst', 'rufdienst', 'visite')",
+            name='ck_schedule_duty_type'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    date: Mapped[datetime.date] = mapped_column()
+    duty_type: Mapped[str] = mapped_column(db.String(16))
+    user_id: Mapped[int] = mapped_column(db.ForeignKey('user.id'), index=True)
+    created_at: Mapped[datetime.datetime] = mapped_column(default=datetime.datetime.utcnow)
+
+    # selectin: der zugehörige User wird beim Rendern praktisch immer gebraucht,
+    # so vermeiden wir das N+1-Nachladen pro Dienst
+    user: Mapped['User'] = db.relationship(back_populates='duties', lazy='selectin')
 
 class Availability(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    start_date = db.Column(db.Date, nullable=False)
-    end_date = db.Column(db.Date, nullable=False)
-    reason = db.Column(db.String(200))  # z.B. "Urlaub", "Fortbildung"
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(db.ForeignKey('user.id'))
+    start_date: Mapped[datetime.date] = mapped_column()
+    end_date: Mapped[datetime.date] = mapped_column()
+    reason: Mapped[Optional[str]] = mapped_column(db.String(200))  # z.B. "Urlaub", "Fortbildung"
+    created_at: Mapped[datetime.datetime] = mapped_column(default=datetime.datetime.utcnow)
+
+    user: Mapped['User'] = db.relationship(back_populates='availabilities')
@@ -1,13 +1,28 @@
-from flask import Flask, render_template, flash, redirect, url_for, request
+from flask import Flask, Blueprint, render_template, flash, redirect, url_for, request
 from markupsafe import Markup  # Änderung hier: Markup ist jetzt in markupsafe
 from flask_login import LoginManager, current_user, login_required
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import sqlite3
 from models import db, User, UserRole, Schedule, DutyType
-from auth import auth
-from datetime import datetime, date
-from scheduling import AutoScheduler
-import calendar as cal
+from datetime import date
+from collections import defaultdict
 import logging
 import os
+import sys
+from functools import wraps
+
+
+def planner_required(fn):
+    """Wie login_required, prüft zusätzlich einmalig die Planner-Rolle."""
+    @wraps(fn)
+    @login_required
+    def wrapper(*args, **kwargs):
+        if current_user.role != UserRole.PLANNER.value:
+            flash('Keine Berechtigung für diese Aktion.')
+            return redirect(url_for('main.calendar'))
+        return fn(*args, **kwargs)
+    return wrapper
 
 # Logging-Konfiguration
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
@@ -17,104 +32,98 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///dienstplan.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# SECRET_KEY aus Umgebungsvariable laden
-SECRET_KEY = os.environ.get('SECRET_KEY')
-
-# In Produktionsmodus (FLASK_ENV != 'development') muss SECRET_KEY gesetzt sein
-flask_env = os.environ.get('FLASK_ENV', 'production')
-if not SECRET_KEY and flask_env != 'development':
-    print("FEHLER: SECRET_KEY ist nicht gesetzt!", file=sys.stderr)
-    print("Bitte setzen Sie die Umgebungsvariable SECRET_KEY vor dem Start der Anwendung.", file=sys.stderr)
-    print("Beispiel: export SECRET_KEY='your-64-character-hex-string-here'", file=sys.stderr)
-    sys.exit(1)
 
-# Fallback für Development-Modus (nur zu Entwicklungszwecken!)
-if not SECRET_KEY:
-    SECRET_KEY = 'dev-key-only-for-development-DO-NOT-USE-IN-PRODUCTION'
-    print("WARNUNG: Development-Modus - unsicherer SECRET_KEY wird verwendet!", file=sys.stderr)
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL-Modus und großzügige Caches für jede neue SQLite-Verbindung.
 
-app.config['SECRET_KEY'] = SECRET_KEY
+    WAL lässt Leser und Schreiber parallel arbeiten, mmap und cache_size
+    reduzieren Kopien aus dem Page-Cache beim read-lastigen /calendar.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.close()
 
-# Initialisierung der Erweiterungen
-db.init_app(app)
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'
-login_manager.login_message = 'Bitte melden Sie sich an, um diese Seite zu sehen.'
 
-# Blueprint registrieren
-app.register_blueprint(auth)
+main = Blueprint('main', __name__)
 
-@login_manager.user_loader
-def load_user(id):
-    return User.query.get(int(id))
 
-@app.route('/')
+@main.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/calendar')
+@main.route('/calendar')
 @login_required
 def calendar():
     # Aktuelles Datum für die initiale Anzeige
     today = date.today()
     year = today.year if 'year' not in request.args else int(request.args.get('year'))
     month = today.month if 'month' not in request.args else int(request.args.get('month'))
-    
+
     # Lade alle Dienste für den ausgewählten Monat
-    start_date = datetime(year, month, 1)
-    end_date = datetime(year, month, cal.monthrange(year, month)[1])
-    
-    duties = Schedule.query.filter(
-        Schedule.date.between(start_date, end_date)
+    # date statt datetime: passt zum Spaltentyp und erspart die Typkonvertierung
+    # Halboffenes Intervall [Monatsanfang, Folgemonat): gleicher Index-Scan
+    # wie BETWEEN, aber ohne Mehrdeutigkeit am Monatsletzten
+    start_date = date(year, month, 1)
+    next_month = date(year + (month == 12), month % 12 + 1, 1)
+
+    # Nur die drei benötigten Spalten laden statt kompletter ORM-Objekte
+    # (inkl. password_hash über die User-Beziehung)
+    duties = db.session.query(
+        Schedule.date, Schedule.duty_type, User.username
+    ).join(User, Schedule.user_id == User.id).filter(
+        Schedule.date >= start_date,
+        Schedule.date < next_month
     ).all()
-    
-    # Debug-Ausgabe
-    logger.debug(f"Dienste für {month}/{year}:")
-    for duty in duties:
-        logger.debug(f"Tag {duty.date.day}: {duty.user.username} - {duty.duty_type.value}")
-    
+
     # Organisiere Dienste nach Datum
-    duty_dict = {}
-    for duty in duties:
-        day = duty.date.day
-        if day not in duty_dict:
-            duty_dict[day] = {}
-        duty_dict[day][duty.duty_type.value] = duty.user.username
-    
-    # Debug-Ausgabe des duty_dict
-    logger.debug("Duty Dictionary:")
-    for day, day_duties in duty_dict.items():
-        logger.debug(f"Tag {day}: {day_duties}")
-    
-    return render_template('calendar.html', 
-                         year=year, 
-                         month=month, 
+    duty_dict = defaultdict(dict)
+    for duty_date, duty_type, username in duties:
+        duty_dict[duty_date.day][duty_type] = username
+
+    logger.debug("%d Dienste für %d/%d geladen", len(duties), month, year)
+
+    return render_template('calendar.html',
+                         year=year,
+                         month=month,
                          duties=duty_dict,
                          current_user=current_user,
                          UserRole=UserRole,
                          DutyType=DutyType)
 
-@app.route('/generate-schedule/<int:year>/<int:month>')
-@login_required
+@main.route('/generate-schedule/<int:year>/<int:month>')
+@planner_required
 def generate_schedule(year, month):
-    if current_user.role != UserRole.PLANNER:
-        flash('Keine Berechtigung für diese Aktion.')
-        return redirect(url_for('calendar'))
-    
+    # Lazy-Import: CLI-Skripte und Auth-Requests brauchen den Scheduler nicht
+    from scheduling import AutoScheduler
+
     scheduler = AutoScheduler(year, month)
     duties = scheduler.distribute_duties()
     summary = scheduler.get_schedule_summary()
-    
+
     # Zeige strukturierte Zusammenfassung
     flash(f'Dienstplan für {month}/{year} wurde erstellt.')
     flash('Dienstverteilung:')
-    
+
     # Erstelle HTML-Tabelle für die Zusammenfassung
+    # ''.join statt wiederholtem += vermeidet das quadratische Umkopieren
+    rows = [
+        f"""
+            <tr>
+                <td>{doc}</td>
+                <td>{stats['dienst']}</td>
+                <td>{stats['rufdienst']}</td>
+                <td>{stats['visite']}</td>
+                <td>{stats['work_percentage']}%</td>
+            </tr>
+        """
+        for doc, stats in summary.items()
+    ]
     table_html = """
     <table class="table table-striped">
         <thead>
@@ -127,45 +136,100 @@ def generate_schedule(year, month):
             </tr>
         </thead>
         <tbody>
-    """
-    
-    for doc, stats in summary.items():
-        table_html += f"""
-            <tr>
-                <td>{doc}</td>
-                <td>{stats['dienst']}</td>
-                <td>{stats['rufdienst']}</td>
-                <td>{stats['visite']}</td>
-                <td>{stats['work_percentage']}%</td>
-            </tr>
-        """
-    
-    table_html += """
+    """ + ''.join(rows) + """
         </tbody>
     </table>
     """
-    
+
     flash(Markup(table_html))
-    
-    return redirect(url_for('calendar'))
 
-@app.route('/make-planner/<username>')
+    return redirect(url_for('main.calendar'))
+
+@main.route('/make-planner/<username>')
 @login_required
 def make_planner(username):
     # Nur der erste registrierte Benutzer darf weitere Planner erstellen
     if current_user.id != 1:
         flash('Keine Berechtigung für diese Aktion.')
-        return redirect(url_for('home'))
-    
+        return redirect(url_for('main.home'))
+
     user = User.query.filter_by(username=username).first()
     if user:
-        user.role = UserRole.PLANNER
+        user.role = UserRole.PLANNER.value
         db.session.commit()
         flash(f'Benutzer {username} wurde zum Planner ernannt.')
     else:
         flash(f'Benutzer {username} nicht gefunden.')
-    
-    return redirect(url_for('home'))
+
+    return redirect(url_for('main.home'))
+
+
+def create_app(cli=False):
+    """App-Factory.
+
+    Mit cli=True entsteht eine minimale App nur mit Datenbank-Anbindung -
+    Skripte wie init_db.py und create_test_user.py sparen sich damit das
+    Laden von Flask-Login, auth.py und der Routen.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///dienstplan.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        # SQLite lokal: kein pre_ping nötig, Verbindungen über Threads teilbar
+        'pool_pre_ping': False,
+        'pool_size': 10,
+        'connect_args': {'check_same_thread': False},
+    }
+
+    # SECRET_KEY aus Umgebungsvariable laden
+    secret_key = os.environ.get('SECRET_KEY')
+
+    # In Produktionsmodus (FLASK_ENV != 'development') muss SECRET_KEY gesetzt sein
+    flask_env = os.environ.get('FLASK_ENV', 'production')
+    if not secret_key and flask_env != 'development':
+        print("FEHLER: SECRET_KEY ist nicht gesetzt!", file=sys.stderr)
+        print("Bitte setzen Sie die Umgebungsvariable SECRET_KEY vor dem Start der Anwendung.", file=sys.stderr)
+        print("Beispiel: export SECRET_KEY='your-64-character-hex-string-here'", file=sys.stderr)
+        sys.exit(1)
+
+    # Fallback für Development-Modus (nur zu Entwicklungszwecken!)
+    if not secret_key:
+        secret_key = 'dev-key-only-for-development-DO-NOT-USE-IN-PRODUCTION'
+        print("WARNUNG: Development-Modus - unsicherer SECRET_KEY wird verwendet!", file=sys.stderr)
+
+    app.config['SECRET_KEY'] = secret_key
+
+    # Initialisierung der Erweiterungen
+    db.init_app(app)
+
+    if not cli:
+        from auth import auth
+
+        login_manager = LoginManager()
+        login_manager.init_app(app)
+        login_manager.login_view = 'auth.login'
+        login_manager.login_message = 'Bitte melden Sie sich an, um diese Seite zu sehen.'
+
+        @login_manager.user_loader
+        def load_user(id):
+            # db.session.get prüft zuerst die Identity-Map und spart so innerhalb
+            # eines Requests den wiederholten SELECT auf den eingeloggten User
+            return db.session.get(User, int(id))
+
+        # Blueprints registrieren
+        app.register_blueprint(auth)
+        app.register_blueprint(main)
+
+        if flask_env != 'development':
+            # Kein mtime-Check pro Render; einmal vorkompilieren, damit der
+            # erste Request nicht die Template-Kompilierung bezahlt
+            app.config['TEMPLATES_AUTO_RELOAD'] = False
+            app.jinja_env.auto_reload = False
+            for template_name in app.jinja_env.list_templates():
+                app.jinja_env.get_template(template_name)
+
+    return app
+
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    create_app().run(debug=True, port=5001)
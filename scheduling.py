@@ -1,153 +1,298 @@
-from datetime import datetime, timedelta
+from datetime import datetime, date as date_cls, timedelta
 import calendar
-from models import User, UserRole, Schedule, DutyType, db
-from flask import current_app
+from sqlalchemy import func, or_
+from models import User, UserRole, Schedule, DutyType, Availability, db
 from workalendar.europe import Germany  # Für Feiertage
 import logging
 
 logger = logging.getLogger(__name__)
 
+__all__ = ['AutoScheduler']
+
+# Punktwerte einmal auf Modulebene statt bei jedem Aufruf ein neues Dict
+_DUTY_POINTS = {
+    DutyType.DIENST.value: 3,
+    DutyType.RUFDIENST.value: 2,
+    DutyType.VISITE.value: 1,
+}
+
 class AutoScheduler:
     def __init__(self, year, month):
         self.year = year
         self.month = month
         self.cal = Germany()
-        with current_app.app_context():
-            self.doctors = User.query.filter_by(role=UserRole.USER).all()
-            self.duty_points = {doc.id: 0 for doc in self.doctors}
-            # Lade historische Daten für das ganze Jahr
-            self.load_historical_duties()
-            # Bestimme Visite-Ärzte für diesen Monat
-            self.visite_doctors = self.get_visite_doctors()
+        # Monatslänge einmal bestimmen - get_days_in_month wird von fast
+        # jeder Abfrage-Hilfsmethode aufgerufen
+        self._ndays = calendar.monthrange(year, month)[1]
+        self._days_cache = None
+        # Feiertage des Jahres als Set - workalendar baut die Liste sonst
+        # bei jedem is_holiday-Aufruf neu auf
+        self._holidays = {holiday for holiday, _name in self.cal.holidays(year)}
+        # Jahr und Monat stehen für eine Scheduler-Instanz fest - alle
+        # Tageseigenschaften des Monats einmal als Tabellen vorberechnen,
+        # statt Wochentag, Feiertag und Kalenderwoche pro Prüfung neu zu
+        # bestimmen
+        first_weekday = calendar.monthrange(year, month)[0]
+        self._weekday_by_day = {
+            day: (first_weekday + day - 1) % 7
+            for day in range(1, self._ndays + 1)
+        }
+        self._weekend_by_day = {
+            day: weekday >= 5
+            for day, weekday in self._weekday_by_day.items()
+        }
+        self._special_by_day = {}
+        self._workday_by_day = {}
+        self._week_of = {}
+        for month_day in self.get_days():
+            day = month_day.date()
+            weekday = self._weekday_by_day[day.day]
+            is_holiday = day in self._holidays
+            self._special_by_day[day.day] = weekday >= 5 or is_holiday
+            self._workday_by_day[day.day] = weekday < 5 and not is_holiday
+            iso = day.isocalendar()
+            self._week_of[day] = (iso[0], iso[1])
+        # Kein eigener app_context-Push: der Scheduler läuft immer innerhalb
+        # eines Requests bzw. eines bereits aktiven Anwendungskontexts
+        # Nur die drei benötigten Spalten als leichte Zeilen-Tupel statt
+        # User-ORM-Objekten: der Scheduler ändert keine Ärzte, und so hängt
+        # die gesamte Verteilung nicht an Session und Identity-Map
+        self.doctors = tuple(
+            User.query.with_entities(User.id, User.username, User.work_percentage)
+            .filter_by(role=UserRole.USER.value).all())
+        # IDs einmal ablesen - erspart den Attributzugriff pro Arzt und Tag
+        self._doctor_ids = tuple(doc.id for doc in self.doctors)
+        # Kehrwert des Arbeitszeit-Faktors je Arzt vorberechnen: die
+        # Kandidatenbewertung multipliziert damit, statt pro Vergleich zu
+        # dividieren und das ORM-Attribut erneut zu lesen
+        self._inv_work = {doc.id: 100.0 / doc.work_percentage for doc in self.doctors}
+        self.duty_points = {doc.id: 0 for doc in self.doctors}
+        # Belegte Ärzte pro Tag einmal vorladen statt einer Abfrage
+        # pro Arzt und Tag in get_available_doctors
+        self._duties_by_date = {}
+        self.load_month_occupancy()
+        # Abwesenheiten (Urlaub, Fortbildung) einmal für den Monat vorladen
+        self._absences_by_user = {}
+        self.load_month_absences()
+        # Monats-Dienstzähler einmal gruppiert laden, danach inkrementell pflegen
+        self.month_counts = self._zero_month_counts()
+        self.load_month_counts()
+        # Lade historische Daten für das ganze Jahr
+        self.load_historical_duties()
+        # Bestimme Visite-Ärzte für diesen Monat
+        self.visite_doctors = self.get_visite_doctors()
+
+    @staticmethod
+    def _as_date(d):
+        """Normalisiert datetime auf date, damit Dict-Schlüssel zusammenpassen"""
+        return d.date() if isinstance(d, datetime) else d
+
+    def _month_range(self):
+        """Halboffene Monatsgrenzen: [Monatsanfang, Anfang des Folgemonats)
+
+        >= und < statt BETWEEN: der Index-Scan bleibt gleich, aber die
+        Obergrenze ist eindeutig - keine Sonderbehandlung des letzten Tages.
+        """
+        start = date_cls(self.year, self.month, 1)
+        next_start = date_cls(self.year + (self.month == 12),
+                              self.month % 12 + 1, 1)
+        return start, next_start
+
+    def load_month_occupancy(self):
+        """Lädt alle belegten (Tag, Arzt)-Paare des Monats in einem Rutsch"""
+        start_date, next_month = self._month_range()
+        rows = db.session.query(
+            Schedule.date, Schedule.user_id, Schedule.duty_type
+        ).filter(
+            Schedule.date >= start_date,
+            Schedule.date < next_month,
+            # Nur die Ärzte, die der Scheduler überhaupt verplant -
+            # Planner-Einträge und Altlasten bleiben draußen
+            Schedule.user_id.in_([doc.id for doc in self.doctors])
+        ).all()
+        self._duties_by_date = {}
+        self.weekend_saturdays_by_doctor = {}
+        self.week_duties = {}
+        self._friday_rufdienst = {}
+        for duty_date, user_id, duty_type in rows:
+            self._duties_by_date.setdefault(duty_date, {}).setdefault(
+                user_id, set()).add(duty_type)
+            self.week_duties.setdefault(self._week_key(duty_date), {}).setdefault(
+                user_id, set()).add(duty_type)
+            self._track_weekend(duty_date, user_id, duty_type)
+            self._track_friday_rufdienst(duty_date, user_id, duty_type)
+
+    def load_month_absences(self):
+        """Lädt alle Abwesenheiten, die den Monat überlappen, in einem Rutsch"""
+        start_date, next_month = self._month_range()
+        rows = db.session.query(
+            Availability.user_id, Availability.start_date, Availability.end_date
+        ).filter(
+            Availability.end_date >= start_date,
+            Availability.start_date < next_month
+        ).all()
+        self._absences_by_user = {}
+        for user_id, absence_start, absence_end in rows:
+            self._absences_by_user.setdefault(user_id, []).append(
+                (absence_start, absence_end))
+
+    def _week_key(self, date):
+        """(ISO-Jahr, ISO-Woche) für ein Datum, für Monatstage vorberechnet"""
+        day = self._as_date(date)
+        week = self._week_of.get(day)
+        if week is None:
+            iso = day.isocalendar()
+            week = (iso[0], iso[1])
+        return week
+
+    def _track_weekend(self, duty_date, user_id, duty_type):
+        """Merkt den Samstag eines Wochenend-Dienstes/Rufdienstes vor"""
+        if duty_type != DutyType.VISITE.value and duty_date.weekday() >= 5:
+            saturday = duty_date - timedelta(days=duty_date.weekday() - 5)
+            self.weekend_saturdays_by_doctor.setdefault(user_id, set()).add(saturday)
+
+    def _track_friday_rufdienst(self, duty_date, user_id, duty_type):
+        """Merkt den Freitags-Rufdienst für die Wochenend-Nachprüfung vor"""
+        if duty_type == DutyType.RUFDIENST.value and duty_date.weekday() == 4:
+            self._friday_rufdienst[duty_date] = user_id
+
+    def _mark_busy(self, duty_date, user_id, duty_type):
+        """Merkt einen zugewiesenen Dienst im Belegungs-Cache vor"""
+        day = self._as_date(duty_date)
+        self._duties_by_date.setdefault(day, {}).setdefault(
+            user_id, set()).add(duty_type)
+        self.week_duties.setdefault(self._week_key(day), {}).setdefault(
+            user_id, set()).add(duty_type)
+        self._track_weekend(day, user_id, duty_type)
+        self._track_friday_rufdienst(day, user_id, duty_type)
+
+    def _zero_month_counts(self):
+        """Frische Nullzähler für alle Ärzte"""
+        return {doc_id: {'dienst': 0, 'rufdienst': 0, 'visite': 0}
+                for doc_id in self._doctor_ids}
+
+    def load_month_counts(self):
+        """Initialisiert die Monats-Dienstzähler mit einer gruppierten Abfrage"""
+        start_date, next_month = self._month_range()
+        rows = db.session.query(
+            Schedule.user_id, Schedule.duty_type, func.count(Schedule.id)
+        ).filter(
+            Schedule.date >= start_date,
+            Schedule.date < next_month
+        ).group_by(Schedule.user_id, Schedule.duty_type).all()
+        for user_id, duty_type, count in rows:
+            counts = self.month_counts.get(user_id)
+            if counts is not None and duty_type in counts:
+                counts[duty_type] = count
+
+    def _count_duty(self, user_id, duty_type):
+        """Erhöht den inkrementellen Monatszähler für einen zugewiesenen Dienst"""
+        counts = self.month_counts.get(user_id)
+        if counts is not None:
+            counts[duty_type] += 1
     
     def load_historical_duties(self):
-        """Lädt alle Dienste des aktuellen Jahres"""
-        start_date = datetime(self.year, 1, 1)
-        end_date = datetime(self.year, 12, 31)
-        historical_duties = Schedule.query.filter(
-            Schedule.date.between(start_date, end_date)
-        ).all()
-        
-        logger.info(f"Geladene historische Dienste von {start_date.date()} bis {end_date.date()}:")
-        for duty in historical_duties:
-            logger.debug(f"{duty.date}: {duty.user.username} - {duty.duty_type.value}")
-            self.duty_points[duty.user.id] += self.calculate_duty_points(
-                duty.duty_type,
-                self.is_special_day(duty.date)
-            )
+        """Berechnet die Jahres-Punktestände mit zwei gruppierten Abfragen
+
+        Statt jede Zeile des Jahres nach Python zu holen, aggregiert die DB:
+        einmal alle Dienste pro (Arzt, Typ), einmal nur die an Wochenenden
+        und Feiertagen. Punkte = Basis x Anzahl + Basis x Spezial-Anzahl,
+        das entspricht der Verdopplung an besonderen Tagen.
+        """
+        start_date = date_cls(self.year, 1, 1)
+        next_year = date_cls(self.year + 1, 1, 1)
+        # strftime('%w'): 0 = Sonntag, 6 = Samstag
+        is_special = or_(
+            func.strftime('%w', Schedule.date).in_(('0', '6')),
+            Schedule.date.in_(list(self._holidays))
+        )
+
+        grouped = db.session.query(
+            Schedule.user_id, Schedule.duty_type, func.count(Schedule.id)
+        ).filter(Schedule.date >= start_date, Schedule.date < next_year)
+
+        logger.info("Lade historische Dienste ab %s", start_date)
+        for user_id, duty_type, count in grouped.group_by(
+                Schedule.user_id, Schedule.duty_type).all():
+            if user_id in self.duty_points:
+                self.duty_points[user_id] += _DUTY_POINTS[duty_type] * count
+        for user_id, duty_type, count in grouped.filter(is_special).group_by(
+                Schedule.user_id, Schedule.duty_type).all():
+            if user_id in self.duty_points:
+                self.duty_points[user_id] += _DUTY_POINTS[duty_type] * count
     
     def get_days_in_month(self):
         """Ermittelt die Anzahl der Tage im Monat"""
-        return calendar.monthrange(self.year, self.month)[1]
+        return self._ndays
+
+    def get_days(self):
+        """Liefert alle Tage des Monats als Liste, beim ersten Aufruf berechnet"""
+        if self._days_cache is None:
+            first_day = datetime(self.year, self.month, 1)
+            self._days_cache = [first_day + timedelta(days=i)
+                                for i in range(self.get_days_in_month())]
+        return self._days_cache
     
     def is_weekend(self, day):
-        """Prüft ob ein Tag am Wochenende liegt"""
-        date = datetime(self.year, self.month, day)
-        return date.weekday() >= 5
-    
+        """Prüft ob ein Monatstag am Wochenende liegt"""
+        return self._weekend_by_day[day]
+
     def is_special_day(self, date):
         """Prüft ob ein Tag ein Wochenende oder Feiertag ist"""
-        return self.is_weekend(date.day) or self.cal.is_holiday(date)
+        day = self._as_date(date)
+        if day.year == self.year and day.month == self.month:
+            return self._special_by_day[day.day]
+        # Außerhalb des Monats (z. B. Wochenend-Ausläufer): direkt rechnen
+        return day.weekday() >= 5 or day in self._holidays
     
     def calculate_duty_points(self, duty_type, is_special):
         """Berechnet Punktewert für verschiedene Diensttypen"""
-        points = {
-            DutyType.DIENST: 3,
-            DutyType.RUFDIENST: 2,
-            DutyType.VISITE: 1
-        }
-        base_points = points[duty_type]
+        base_points = _DUTY_POINTS[duty_type]
         return base_points * 2 if is_special else base_points
     
     def get_doctor_duties(self, doctor_id, date):
-        """Holt alle Dienste eines Arztes für ein bestimmtes Datum"""
-        return Schedule.query.filter_by(
-            user_id=doctor_id,
-            date=date
-        ).all()
+        """Holt die Diensttypen eines Arztes für ein Datum aus dem Belegungs-Cache"""
+        return self._duties_by_date.get(self._as_date(date), {}).get(doctor_id, ())
 
     def get_weekend_count(self, doctor_id):
         """Ermittelt die Anzahl der Wochenenden, an denen ein Arzt Dienst oder Rufdienst hat"""
-        start_date = datetime(self.year, self.month, 1)
-        end_date = datetime(self.year, self.month, self.get_days_in_month())
-        
-        weekend_days = Schedule.query.filter(
-            Schedule.user_id == doctor_id,
-            Schedule.date.between(start_date, end_date),
-            Schedule.duty_type.in_([DutyType.DIENST, DutyType.RUFDIENST])
-        ).all()
-        
-        # Zähle nur Samstage als neue Wochenenden
-        weekends = set()
-        for duty in weekend_days:
-            if duty.date.weekday() >= 5:  # Samstag oder Sonntag
-                # Berechne den Samstag dieser Woche
-                saturday = duty.date - timedelta(days=duty.date.weekday() - 5)
-                weekends.add(saturday.date())
-        
-        return len(weekends)
+        return len(self.weekend_saturdays_by_doctor.get(doctor_id, ()))
 
     def get_duty_counts(self, doctor_id):
-        """Ermittelt die Anzahl der verschiedenen Dienste eines Arztes"""
-        start_date = datetime(self.year, self.month, 1)
-        end_date = datetime(self.year, self.month, self.get_days_in_month())
-        
-        duties = Schedule.query.filter(
-            Schedule.user_id == doctor_id,
-            Schedule.date.between(start_date, end_date)
-        ).all()
-        
-        counts = {
-            'dienst': 0,
-            'rufdienst': 0,
-            'visite': 0
-        }
-        
-        for duty in duties:
-            if duty.duty_type == DutyType.DIENST:
-                counts['dienst'] += 1
-            elif duty.duty_type == DutyType.RUFDIENST:
-                counts['rufdienst'] += 1
-            elif duty.duty_type == DutyType.VISITE:
-                counts['visite'] += 1
-                
-        return counts
+        """Liefert die inkrementell gepflegten Monats-Dienstzähler eines Arztes"""
+        return self.month_counts[doctor_id]
 
 
     def get_last_visite_doctor(self, date):
-        """Ermittelt welcher Arzt in der Vorwoche Visite hatte"""
-        prev_date = date - timedelta(days=1)
-        prev_duties = Schedule.query.filter_by(
-            date=prev_date,
-            duty_type=DutyType.VISITE
-        ).first()
-        return prev_duties.user_id if prev_duties else None
+        """Ermittelt welcher Arzt am Vortag Visite hatte"""
+        prev_date = self._as_date(date) - timedelta(days=1)
+        for user_id, duty_types in self._duties_by_date.get(prev_date, {}).items():
+            if DutyType.VISITE.value in duty_types:
+                return user_id
+        return None
 
     def get_friday_rufdienst(self, weekend_date):
-        """Ermittelt den Rufdienst vom Freitag für ein Wochenendatum"""
-        friday_date = weekend_date - timedelta(days=weekend_date.weekday() - 4)
-        friday_duty = Schedule.query.filter_by(
-            date=friday_date,
-            duty_type=DutyType.RUFDIENST
-        ).first()
-        return friday_duty
+        """Ermittelt den Arzt mit Freitags-Rufdienst für ein Wochenendatum
+
+        Liest aus dem Freitags-Cache statt per Abfrage; liefert die user_id
+        oder None, wenn der Freitag (noch) keinen Rufdienst hat.
+        """
+        day = self._as_date(weekend_date)
+        friday_date = day - timedelta(days=day.weekday() - 4)
+        return self._friday_rufdienst.get(friday_date)
 
     def get_week_number(self, date):
-        """Ermittelt die Kalenderwoche für ein Datum"""
-        return date.isocalendar()[1]
-        
+        """Ermittelt die Kalenderwoche für ein Datum (für Monatstage gecacht)"""
+        day = self._as_date(date)
+        week = self._week_of.get(day)
+        if week is not None:
+            return week[1]
+        return day.isocalendar()[1]
+
     def is_visite_week(self, doctor_id, date):
         """Prüft ob ein Arzt in dieser Woche Visite hat"""
-        week_start = date - timedelta(days=date.weekday())
-        week_end = week_start + timedelta(days=6)
-        
-        visite_duties = Schedule.query.filter(
-            Schedule.date.between(week_start, week_end),
-            Schedule.duty_type == DutyType.VISITE,
-            Schedule.user_id == doctor_id
-        ).all()
-        
-        return len(visite_duties) > 0
+        week_duties = self.week_duties.get(self._week_key(date), {})
+        return DutyType.VISITE.value in week_duties.get(doctor_id, ())
 
     def get_visite_doctors(self):
         """Ermittelt die Ärzte, die in diesem Monat bevorzugt Visite machen"""
@@ -160,108 +305,138 @@ class AutoScheduler:
         
         return sorted_docs[:visite_count]
     
+    def _is_absent(self, doctor_id, date):
+        """Prüft ob ein Arzt an einem Tag als abwesend eingetragen ist"""
+        day = self._as_date(date)
+        for absence_start, absence_end in self._absences_by_user.get(doctor_id, ()):
+            if absence_start <= day <= absence_end:
+                return True
+        return False
+
     def can_work_on_date(self, doctor_id, date, duty_type):
         """Prüft ob ein Arzt an einem bestimmten Tag arbeiten kann"""
+        # Eingetragene Abwesenheiten blockieren den Tag komplett
+        if self._is_absent(doctor_id, date):
+            logger.debug("Arzt %s ist am %s abwesend", doctor_id, date)
+            return False
+
         # Prüfe ob Dienstag und ob der Arzt Samstag Dienst hatte
         if date.weekday() == 1:  # Dienstag
             saturday = date - timedelta(days=3)  # 3 Tage zurück = Samstag
-            saturday_duties = self.get_doctor_duties(doctor_id, saturday)
-            for duty in saturday_duties:
-                if duty.duty_type == DutyType.DIENST:
-                    logger.debug(f"Arzt {doctor_id} hatte Samstag Dienst, hat diesen Dienstag frei")
-                    return False
+            if DutyType.DIENST.value in self.get_doctor_duties(doctor_id, saturday):
+                logger.debug("Arzt %s hatte Samstag Dienst, hat diesen Dienstag frei", doctor_id)
+                return False
         
         # Wenn Visite, dann keine anderen Dienste in der Woche
         if self.is_visite_week(doctor_id, date):
-            if duty_type != DutyType.VISITE:
-                logger.debug(f"Arzt {doctor_id} hat diese Woche Visite, kann keine anderen Dienste machen")
+            if duty_type != DutyType.VISITE.value:
+                logger.debug("Arzt %s hat diese Woche Visite, kann keine anderen Dienste machen", doctor_id)
                 return False
         
         # Wenn andere Dienste in der Woche, dann keine Visite
-        if duty_type == DutyType.VISITE:
-            week_start = date - timedelta(days=date.weekday())
-            week_end = week_start + timedelta(days=6)
-            other_duties = Schedule.query.filter(
-                Schedule.date.between(week_start, week_end),
-                Schedule.user_id == doctor_id,
-                Schedule.duty_type != DutyType.VISITE
-            ).all()
-            if other_duties:
-                logger.debug(f"Arzt {doctor_id} hat diese Woche andere Dienste, kann keine Visite machen")
+        if duty_type == DutyType.VISITE.value:
+            week_duties = self.week_duties.get(self._week_key(date), {}).get(doctor_id, ())
+            if any(t != DutyType.VISITE.value for t in week_duties):
+                logger.debug("Arzt %s hat diese Woche andere Dienste, kann keine Visite machen", doctor_id)
                 return False
         
         # Prüfe vorherigen Tag auf Dienst
         prev_day = date - timedelta(days=1)
-        prev_duties = self.get_doctor_duties(doctor_id, prev_day)
-        
-        for duty in prev_duties:
-            if duty.duty_type == DutyType.DIENST:
-                logger.debug(f"Arzt {doctor_id} hatte gestern Dienst, kann heute nicht arbeiten")
-                return False
+        if DutyType.DIENST.value in self.get_doctor_duties(doctor_id, prev_day):
+            logger.debug("Arzt %s hatte gestern Dienst, kann heute nicht arbeiten", doctor_id)
+            return False
         
         # Prüfe Wochenend-Limit
         if self.is_weekend(date.day) and self.get_weekend_count(doctor_id) >= 2:
-            logger.debug(f"Arzt {doctor_id} hat bereits 2 Wochenenden in diesem Monat")
+            logger.debug("Arzt %s hat bereits 2 Wochenenden in diesem Monat", doctor_id)
             return False
         
         # Prüfe auf Rufdienst-Wochenende
-        if duty_type == DutyType.RUFDIENST and date.weekday() >= 5:  # Samstag oder Sonntag
-            friday_duty = self.get_friday_rufdienst(date)
-            if friday_duty and friday_duty.user_id != doctor_id:
-                logger.debug(f"Arzt {doctor_id} kann nicht Rufdienst am Wochenende haben, da anderer Arzt am Freitag Rufdienst hatte")
+        if duty_type == DutyType.RUFDIENST.value and date.weekday() >= 5:  # Samstag oder Sonntag
+            friday_doc = self.get_friday_rufdienst(date)
+            if friday_doc is not None and friday_doc != doctor_id:
+                logger.debug("Arzt %s kann nicht Rufdienst am Wochenende haben, da anderer Arzt am Freitag Rufdienst hatte", doctor_id)
                 return False
-            elif friday_duty and friday_duty.user_id == doctor_id:
+            elif friday_doc == doctor_id:
                 return True
         
         return True
     
+    def _load_key(self, duty_type):
+        """Sortierschlüssel: (Dienste des Typs, Punkte) je Arbeitszeit-Anteil"""
+        inv_work = self._inv_work
+        def key(doc):
+            factor = inv_work[doc.id]
+            return (self.get_duty_counts(doc.id)[duty_type] * factor,
+                    self.duty_points[doc.id] * factor)
+        return key
+
     def get_available_doctors(self, date, duty_type):
         """Ermittelt verfügbare Ärzte für ein Datum und Diensttyp"""
         available_docs = []
-        for doc in self.doctors:
+        busy = self._duties_by_date.get(self._as_date(date), ())
+        for doc, doc_id in zip(self.doctors, self._doctor_ids):
             try:
-                existing_duty = Schedule.query.filter_by(
-                    user_id=doc.id,
-                    date=date
-                ).first()
-                
-                if not existing_duty and self.can_work_on_date(doc.id, date, duty_type):
+                if doc_id not in busy and self.can_work_on_date(doc_id, date, duty_type):
                     available_docs.append(doc)
             except Exception as e:
-                logger.error(f"Fehler beim Prüfen der Verfügbarkeit für {doc.username}: {e}")
+                logger.error("Fehler beim Prüfen der Verfügbarkeit für %s: %s", doc.username, e, exc_info=True)
                 continue
-        
+
         return available_docs
     
     def assign_duty(self, date, duty_type):
-        """Weist einen Dienst einem Arzt zu"""
+        """Weist einen Dienst zu und liefert die erzeugten Schedule-Objekte
+
+        Die Objekte werden nicht hier, sondern gesammelt vom Aufrufer in die
+        Session gehängt - so gibt es genau eine Stelle, die die Session anfasst.
+        """
         # Wenn Samstag oder Sonntag und Rufdienst, dann MUSS es der Freitags-Rufdienst sein
-        if duty_type == DutyType.RUFDIENST and date.weekday() >= 5:
-            friday_duty = self.get_friday_rufdienst(date)
-            if friday_duty:
+        if duty_type == DutyType.RUFDIENST.value and date.weekday() >= 5:
+            friday_doc = self.get_friday_rufdienst(date)
+            if friday_doc is not None:
+                # Der Freitags-Rufdienst deckt das Wochenende normalerweise
+                # schon über die Vorab-Zuweisung ab - dann nichts doppeln
+                if duty_type in self.get_doctor_duties(friday_doc, date):
+                    return []
                 duty = Schedule(
                     date=date,
                     duty_type=duty_type,
-                    user_id=friday_duty.user_id
+                    user_id=friday_doc
                 )
-                logger.info(f"Wochenend-Rufdienst automatisch zugewiesen: {friday_duty.user.username} - {date}")
-                return duty
+                self._mark_busy(date, friday_doc, duty_type)
+                self._count_duty(friday_doc, duty_type)
+                logger.info("Wochenend-Rufdienst automatisch zugewiesen: Arzt %s - %s", friday_doc, date)
+                return [duty]
             else:
-                logger.warning(f"Kein Freitags-Rufdienst gefunden für Wochenende {date}")
-                return None
+                logger.warning("Kein Freitags-Rufdienst gefunden für Wochenende %s", date)
+                return []
 
         available_docs = self.get_available_doctors(date, duty_type)
+        if not available_docs and duty_type == DutyType.DIENST.value:
+            # Der tägliche Dienst darf nicht leer bleiben: statt einer stillen
+            # Lücke im Plan die weichen Regeln (Wochenend-Limit, Ruhetage)
+            # lockern und nur Belegung und Abwesenheit hart prüfen
+            busy = self._duties_by_date.get(self._as_date(date), ())
+            available_docs = [
+                doc for doc, doc_id in zip(self.doctors, self._doctor_ids)
+                if doc_id not in busy and not self._is_absent(doc_id, date)
+            ]
+            if available_docs:
+                logger.warning("Keine regulär verfügbaren Ärzte für %s - weiche Regeln gelockert", date)
         if not available_docs:
-            logger.warning(f"Keine verfügbaren Ärzte für {date} ({duty_type})")
-            return None
+            logger.warning("Keine verfügbaren Ärzte für %s (%s)", date, duty_type)
+            return []
         
         # Wähle Arzt basierend auf Diensttyp und Arbeitszeit
-        if duty_type == DutyType.VISITE:
+        if duty_type == DutyType.VISITE.value:
             # Wenn Montag, wähle bevorzugt aus Visite-Ärzten
             if date.weekday() == 0:  # Montag
                 available_visite_docs = [doc for doc in available_docs if doc in self.visite_doctors]
                 if available_visite_docs:
                     available_docs = available_visite_docs
+                # min statt sort: nur das Minimum wird gebraucht
+                chosen_doc = min(available_docs, key=self._load_key(duty_type))
             # An anderen Tagen, bevorzuge den Arzt vom Vortag
             else:
                 last_visite_doc = self.get_last_visite_doctor(date)
@@ -271,26 +446,14 @@ class AutoScheduler:
                             chosen_doc = doc
                             break
                     else:
-                        # Sortiere nach Visiten pro Arbeitszeit-Prozent
-                        available_docs.sort(key=lambda x: (
-                            self.get_duty_counts(x.id)['visite'] / (x.work_percentage/100),
-                            self.duty_points[x.id] / (x.work_percentage/100)
-                        ))
-                        chosen_doc = available_docs[0]
+                        # min statt sort: nur das Minimum wird gebraucht
+                        chosen_doc = min(available_docs, key=self._load_key(duty_type))
                 else:
-                    # Sortiere nach Visiten pro Arbeitszeit-Prozent
-                    available_docs.sort(key=lambda x: (
-                        self.get_duty_counts(x.id)['visite'] / (x.work_percentage/100),
-                        self.duty_points[x.id] / (x.work_percentage/100)
-                    ))
-                    chosen_doc = available_docs[0]
+                    # min statt sort: nur das Minimum wird gebraucht
+                    chosen_doc = min(available_docs, key=self._load_key(duty_type))
         else:
             # Bei anderen Diensten: Berücksichtige Dienstanzahl pro Arbeitszeit-Prozent
-            available_docs.sort(key=lambda x: (
-                self.get_duty_counts(x.id)[duty_type.value.lower()] / (x.work_percentage/100),
-                self.duty_points[x.id] / (x.work_percentage/100)
-            ))
-            chosen_doc = available_docs[0]
+            chosen_doc = min(available_docs, key=self._load_key(duty_type))
         
         try:
             duty = Schedule(
@@ -298,96 +461,112 @@ class AutoScheduler:
                 duty_type=duty_type,
                 user_id=chosen_doc.id
             )
-            
+            self._mark_busy(date, chosen_doc.id, duty_type)
+            self._count_duty(chosen_doc.id, duty_type)
+            created = [duty]
+
             # Aktualisiere Punktestand
             self.duty_points[chosen_doc.id] += self.calculate_duty_points(
-                duty_type, 
+                duty_type,
                 self.is_special_day(date)
             )
-            
-            logger.info(f"Dienst zugewiesen: {chosen_doc.username} - {date} - {duty_type.value}")
-            
+
+            logger.info("Dienst zugewiesen: %s - %s - %s", chosen_doc.username, date, duty_type)
+
             # Wenn Freitag-Rufdienst, gleich das ganze Wochenende zuweisen
-            if duty_type == DutyType.RUFDIENST and date.weekday() == 4:  # Freitag
-                logger.info(f"Freitag-Rufdienst: Weise Wochenende für {chosen_doc.username} zu")
+            if duty_type == DutyType.RUFDIENST.value and date.weekday() == 4:  # Freitag
+                logger.info("Freitag-Rufdienst: Weise Wochenende für %s zu", chosen_doc.username)
                 for days_ahead in [1, 2]:  # Samstag und Sonntag
                     weekend_date = date + timedelta(days=days_ahead)
                     weekend_duty = Schedule(
                         date=weekend_date,
-                        duty_type=DutyType.RUFDIENST,
+                        duty_type=DutyType.RUFDIENST.value,
                         user_id=chosen_doc.id
                     )
+                    self._mark_busy(weekend_date, chosen_doc.id, DutyType.RUFDIENST.value)
+                    self._count_duty(chosen_doc.id, DutyType.RUFDIENST.value)
                     self.duty_points[chosen_doc.id] += self.calculate_duty_points(
-                        DutyType.RUFDIENST, 
+                        DutyType.RUFDIENST.value,
                         True  # Wochenende
                     )
-                    db.session.add(weekend_duty)
-                    logger.info(f"Wochenend-Rufdienst zugewiesen: {chosen_doc.username} - {weekend_date}")
-            
-            return duty
-            
+                    created.append(weekend_duty)
+                    logger.info("Wochenend-Rufdienst zugewiesen: %s - %s", chosen_doc.username, weekend_date)
+
+            return created
+
         except Exception as e:
-            logger.error(f"Fehler bei der Dienstzuweisung: {e}")
-            return None
+            logger.error("Fehler bei der Dienstzuweisung: %s", e, exc_info=True)
+            return []
     
     def distribute_duties(self):
         """Verteilt alle Dienste für den Monat"""
-        days = self.get_days_in_month()
+        # Ohne Ärzte gäbe es nur 3 Warnungen pro Tag und am Ende eine leere Liste
+        if not self.doctors:
+            logger.warning("Keine Ärzte vorhanden - Dienstverteilung übersprungen")
+            return []
+
         duties = []
         
         try:
-            # Lösche bestehende Einträge für diesen Monat
-            start_date = datetime(self.year, self.month, 1)
-            end_date = datetime(self.year, self.month, days)
-            
-            existing_duties = Schedule.query.filter(
-                Schedule.date.between(start_date, end_date)
-            ).all()
-            
-            for duty in existing_duties:
-                db.session.delete(duty)
-            
-            logger.info(f"Starte Dienstverteilung für {self.month}/{self.year}")
-            
-            # Verteile neue Dienste
-            for day in range(1, days + 1):
-                date = datetime(self.year, self.month, day)
-                is_special = self.is_special_day(date)
-                
-                logger.debug(f"Verteilung für Tag {day} ({'Wochenende/Feiertag' if is_special else 'Werktag'}):")
-                
-                # Regulärer Dienst (jeden Tag)
-                dienst = self.assign_duty(date, DutyType.DIENST)
-                if dienst:
-                    duties.append(dienst)
-                    db.session.add(dienst)
-                
-                # Rufdienst (jeden Tag außer Samstag/Sonntag, da diese vom Freitag automatisch gesetzt werden)
-                rufdienst = None
-                if date.weekday() not in [5, 6]:  # Nicht Samstag oder Sonntag
-                    rufdienst = self.assign_duty(date, DutyType.RUFDIENST)
-                    if rufdienst:
-                        duties.append(rufdienst)
-                        db.session.add(rufdienst)
-                else:  # Samstag oder Sonntag
-                    rufdienst = self.assign_duty(date, DutyType.RUFDIENST)  # Wird automatisch vom Freitag übernommen
-                    if rufdienst:
-                        duties.append(rufdienst)
-                        db.session.add(rufdienst)
-                
-                # Visite (Montag bis Freitag, außer an Feiertagen)
-                if date.weekday() < 5 and not self.cal.is_holiday(date):  # Mo-Fr und kein Feiertag
-                    visite = self.assign_duty(date, DutyType.VISITE)
-                    if visite:
-                        duties.append(visite)
-                        db.session.add(visite)
-            
-            # Commit der Änderungen
+            # Lösche bestehende Einträge für diesen Monat mit einem einzigen
+            # DELETE statt sie erst zu laden und einzeln zu löschen
+            start_date, next_month = self._month_range()
+
+            deleted = Schedule.query.filter(
+                Schedule.date >= start_date,
+                Schedule.date < next_month
+            ).delete(synchronize_session=False)
+            logger.info("%s bestehende Dienste für %s/%s gelöscht", deleted, self.month, self.year)
+
+            # Caches zurücksetzen, die gelöschten Einträge sind weg
+            self._duties_by_date = {}
+            self.weekend_saturdays_by_doctor = {}
+            self.week_duties = {}
+            self._friday_rufdienst = {}
+            self.month_counts = self._zero_month_counts()
+
+            logger.info("Starte Dienstverteilung für %s/%s", self.month, self.year)
+
+            # Konstante Lookups einmal vor der Schleife binden statt
+            # pro Tag erneut über Enum und self aufzulösen
+            dienst_t = DutyType.DIENST.value
+            rufdienst_t = DutyType.RUFDIENST.value
+            visite_t = DutyType.VISITE.value
+            assign = self.assign_duty
+
+            # Alle (Tag, Diensttyp)-Aufgaben vorab als flache Liste aufbauen:
+            # Dienst und Rufdienst fallen jeden Tag an (Samstag/Sonntag
+            # übernimmt der Freitags-Rufdienst), Visite nur Mo-Fr außer an
+            # Feiertagen. Eine flache Schleife statt verschachtelter
+            # Fallunterscheidungen pro Tag.
+            # Die Tages-Debugzeile berechnet ihre Argumente (Feiertagsprüfung)
+            # auch bei lazy Formatierung eifrig - einmal den Level prüfen
+            debug_on = logger.isEnabledFor(logging.DEBUG)
+
+            tasks = []
+            for date in self.get_days():
+                if debug_on:
+                    logger.debug("Verteilung für Tag %s (%s):", date.day,
+                                 'Wochenende/Feiertag' if self.is_special_day(date) else 'Werktag')
+                tasks.append((date, dienst_t))
+                tasks.append((date, rufdienst_t))
+                if self._workday_by_day[date.day]:
+                    tasks.append((date, visite_t))
+
+            # Verteile neue Dienste - die Objekte werden nur gesammelt,
+            # die Session sieht sie erst beim Bulk-Insert am Ende
+            for date, duty_type in tasks:
+                duties.extend(assign(date, duty_type))
+
+            # Ein Bulk-Insert statt Unit-of-Work-Buchhaltung pro Objekt:
+            # alle Regelprüfungen laufen während der Verteilung gegen die
+            # Caches, kein Lesezugriff braucht die ungeschriebenen Zeilen
+            db.session.bulk_save_objects(duties)
             db.session.commit()
-            logger.info(f"Dienstplan erfolgreich erstellt mit {len(duties)} Diensten")
+            logger.info("Dienstplan erfolgreich erstellt mit %s Diensten", len(duties))
             
         except Exception as e:
-            logger.error(f"Fehler bei der Dienstplanerstellung: {e}")
+            logger.error("Fehler bei der Dienstplanerstellung: %s", e, exc_info=True)
             db.session.rollback()
             return []
         
@@ -396,7 +575,9 @@ class AutoScheduler:
     def get_schedule_summary(self):
         """Erstellt eine strukturierte Zusammenfassung der Dienstverteilung"""
         summary = {}
+        name_by_id = {}
         for doc in self.doctors:
+            name_by_id[doc.id] = doc.username
             summary[doc.username] = {
                 'dienst': 0,
                 'rufdienst': 0,
@@ -406,28 +587,29 @@ class AutoScheduler:
                 'rufdienst_pro_arbeitszeit': 0,
                 'visite_pro_arbeitszeit': 0
             }
-        
-        # Zähle alle Dienste des aktuellen Monats
-        start_date = datetime(self.year, self.month, 1)
-        end_date = datetime(self.year, self.month, self.get_days_in_month())
-        
-        current_duties = Schedule.query.filter(
-            Schedule.date.between(start_date, end_date)
-        ).all()
-        
-        for duty in current_duties:
-            if duty.duty_type == DutyType.DIENST:
-                summary[duty.user.username]['dienst'] += 1
-            elif duty.duty_type == DutyType.RUFDIENST:
-                summary[duty.user.username]['rufdienst'] += 1
-            elif duty.duty_type == DutyType.VISITE:
-                summary[duty.user.username]['visite'] += 1
-        
+
+        # Die Dienste des Monats gruppiert in der Datenbank zählen: höchstens
+        # drei Zeilen pro Arzt statt aller Dienstzeilen als ORM-Objekte samt
+        # User-Nachladen pro Zeile
+        start_date, next_month = self._month_range()
+        rows = db.session.query(
+            Schedule.user_id, Schedule.duty_type, func.count(Schedule.id)
+        ).filter(
+            Schedule.date >= start_date,
+            Schedule.date < next_month,
+            Schedule.user_id.in_(self._doctor_ids)
+        ).group_by(Schedule.user_id, Schedule.duty_type).all()
+
+        for user_id, duty_type, count in rows:
+            stats = summary[name_by_id[user_id]]
+            if duty_type in ('dienst', 'rufdienst', 'visite'):
+                stats[duty_type] = count
+
         # Berechne Dienste pro Arbeitszeit
         for username, stats in summary.items():
             work_factor = stats['work_percentage'] / 100
             stats['dienst_pro_arbeitszeit'] = round(stats['dienst'] / work_factor, 2)
             stats['rufdienst_pro_arbeitszeit'] = round(stats['rufdienst'] / work_factor, 2)
             stats['visite_pro_arbeitszeit'] = round(stats['visite'] / work_factor, 2)
-        
+
         return summary
\ No newline at end of file